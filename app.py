@@ -1,50 +1,185 @@
 """
 Main Flask application for disaster relief system
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 from datetime import datetime
 import sys
-from models import init_db, get_db, Hub, Donation, VictimRequest, DisasterEvent
+import time
+import orjson
+from sqlalchemy import select, func
+from models import (
+    init_db, SessionLocal, Hub, Donation, DonationTracking, VictimRequest, DisasterEvent,
+    HUB_COLUMNS, DONATION_COLUMNS, DONATION_TRACKING_COLUMNS, VICTIM_REQUEST_COLUMNS,
+    HubRow, DonationRow, VictimRequestRow, tracking_entry
+)
 from utils.disaster_utils import (
     extract_location_from_tweet,
+    extract_locations_from_tweets,
     geocode_location,
-    find_nearby_hubs,
     find_best_hub_for_request,
-    classify_disaster_type,
-    assess_severity
+    prime_geocode_cache,
+    warmup_nlp,
+    warmup_hub_scoring,
+    invalidate_hub_index
 )
+from utils.json_provider import OrjsonProvider
+from tasks import analyze_tweet, analyze_tweets, process_tweet, process_tweets
 
 load_dotenv()
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+# Flask 3 reads these from the provider (JSON_SORT_KEYS / JSONIFY_PRETTYPRINT_REGULAR are gone)
+app.json.sort_keys = False
+app.json.compact = True
 CORS(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+# Bound request bodies so oversized JSON is rejected before it is parsed
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 1024 * 1024))
 
 # Initialize database
 init_db()
+prime_geocode_cache()
+
+# Load the NER model and hub scoring kernel before serving the first request
+warmup_nlp()
+warmup_hub_scoring()
 
 ADMIN_KEY = os.getenv('ADMIN_KEY', 'admin123')
 
+# Optional background queue for /api/predict-location (enabled by REDIS_URL)
+REDIS_URL = os.getenv('REDIS_URL')
+task_queue = None
+if REDIS_URL:
+    from redis import Redis
+    from rq import Queue
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job, JobStatus
+    task_queue = Queue('predictions', connection=Redis.from_url(REDIS_URL))
+
 # Server start time
 SERVER_START_TIME = datetime.now()
 
+# /health is polled by load balancers; serve a precomputed body for a few seconds
+HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', '3.0'))
+_health_cache = {'ts': 0.0, 'body': None}
+
+# Hub dicts shared by the matching endpoints; dropped on hub CRUD and
+# refreshed after HUBS_CACHE_TTL so other workers pick up changes too
+HUBS_CACHE_TTL = float(os.getenv('HUBS_CACHE_TTL', '30'))
+_hubs_cache = {'rows': None, 'ts': 0.0}
+
+# Upper bound on tweets accepted by /api/predict-location/batch
+MAX_BATCH_TWEETS = int(os.getenv('MAX_BATCH_TWEETS', '500'))
+
+# Uncached locations geocoded per batch call; lookups are rate limited, so
+# this bounds how long the request is held (about one second each)
+MAX_BATCH_GEOCODE_LOOKUPS = int(os.getenv('MAX_BATCH_GEOCODE_LOOKUPS', '10'))
+
+# Seconds a queued batch may run; its uncached lookups are rate limited too
+BATCH_JOB_TIMEOUT = int(os.getenv('BATCH_JOB_TIMEOUT', '3600'))
+
+# Rows fetched per round-trip when streaming /api/admin/donations
+DONATION_STREAM_BATCH = 500
+
+
+def get_db():
+    """Get the database session for the current request"""
+    db = getattr(g, '_db', None)
+    if db is None:
+        db = g._db = SessionLocal()
+    return db
+
+
+@app.teardown_request
+def close_db(exc=None):
+    """Close the request's database session, if one was opened"""
+    db = g.pop('_db', None)
+    if db is not None:
+        db.close()
+
+
+@app.before_request
+def reject_oversized_body():
+    """Refuse bodies over MAX_CONTENT_LENGTH before any handler reads them"""
+    limit = app.config['MAX_CONTENT_LENGTH']
+    if limit is not None and (request.content_length or 0) > limit:
+        raise RequestEntityTooLarge()
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error': 'Request body too large'}), 413
+
+
+def get_hubs_cached(db):
+    """Get all hubs as dicts, served from the in-process cache when fresh"""
+    now = time.monotonic()
+    if _hubs_cache['rows'] is None or now - _hubs_cache['ts'] >= HUBS_CACHE_TTL:
+        _hubs_cache['rows'] = [hub.to_dict() for hub in db.query(Hub).all()]
+        _hubs_cache['ts'] = now
+    return _hubs_cache['rows']
+
+
+def invalidate_hubs_cache():
+    """Drop cached hubs and the spatial index built from them"""
+    _hubs_cache['rows'] = None
+    invalidate_hub_index()
+
+
+def attach_tracking_history(db, donations):
+    """
+    Append donation_tracking entries to the tracking_history of DonationRow
+    objects (in place), using one query for the whole list
+    """
+    if not donations:
+        return donations
+    
+    entries = {}
+    rows = db.execute(
+        select(*DONATION_TRACKING_COLUMNS)
+        .where(DonationTracking.donation_id.in_([d.id for d in donations]))
+        .order_by(DonationTracking.id)
+    )
+    for donation_id, status, note, timestamp, hub_id in rows:
+        entries.setdefault(donation_id, []).append(tracking_entry(status, note, timestamp, hub_id))
+    
+    for donation in donations:
+        donation.tracking_history = (donation.tracking_history or []) + entries.get(donation.id, [])
+    return donations
+
+
+def _count(model, *criteria):
+    """Scalar COUNT(*) subquery over model, optionally filtered"""
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """
     Enhanced health check endpoint with server information
     """
+    now = time.monotonic()
+    if _health_cache['body'] is not None and now - _health_cache['ts'] < HEALTH_CACHE_TTL:
+        return Response(_health_cache['body'], 200, mimetype='application/json')
+    
     try:
         # Test database connection
         db = get_db()
-        hubs_count = db.query(Hub).count()
-        donations_count = db.query(Donation).count()
-        requests_count = db.query(VictimRequest).count()
-        events_count = db.query(DisasterEvent).count()
-        db.close()
+        counts = db.execute(select(
+            _count(Hub).label('hubs'),
+            _count(Donation).label('donations'),
+            _count(VictimRequest).label('requests'),
+            _count(DisasterEvent).label('events')
+        )).one()
+        hubs_count = counts.hubs
+        donations_count = counts.donations
+        requests_count = counts.requests
+        events_count = counts.events
         
         db_status = 'connected'
     except Exception as e:
@@ -55,7 +190,7 @@ def health_check():
     uptime_seconds = int(uptime.total_seconds())
     uptime_str = f"{uptime_seconds // 3600}h {(uptime_seconds % 3600) // 60}m {uptime_seconds % 60}s"
     
-    return jsonify({
+    body = orjson.dumps({
         'status': 'healthy',
         'message': '✅ Disaster Relief API Server is Running',
         'server': {
@@ -85,6 +220,8 @@ def health_check():
         'endpoints': {
             'health': '/health',
             'predict_location': '/api/predict-location',
+            'predict_location_batch': '/api/predict-location/batch',
+            'predict_location_result': '/api/predict-location/result/<task_id>',
             'admin_auth': '/api/admin/auth',
             'hubs': '/api/admin/hubs',
             'donations': '/api/donations',
@@ -92,7 +229,11 @@ def health_check():
             'dashboard': '/api/dashboard/stats'
         },
         'timestamp': datetime.now().isoformat()
-    }), 200
+    })
+    _health_cache['ts'] = now
+    _health_cache['body'] = body
+    
+    return Response(body, 200, mimetype='application/json')
 
 
 @app.route('/api/predict-location', methods=['POST'])
@@ -101,6 +242,8 @@ def predict_location():
     Predict location from disaster tweet
     Input: {"tweet": "Earthquake hits Tokyo"}
     Output: {"location": "Tokyo", "latitude": 35.6762, "longitude": 139.6503, ...}
+    With REDIS_URL set the tweet is queued instead and the response is
+    {"task_id": ...} (202); poll /api/predict-location/result/<task_id>
     """
     try:
         data = request.get_json()
@@ -109,69 +252,91 @@ def predict_location():
         if not tweet:
             return jsonify({'error': 'Tweet text is required'}), 400
         
+        if task_queue is not None:
+            job = task_queue.enqueue(process_tweet, tweet)
+            return jsonify({'success': True, 'task_id': job.id, 'status': job.get_status()}), 202
+        
         # Extract location using NER model
         location = extract_location_from_tweet(tweet)
         
-        if not location:
-            return jsonify({
-                'success': False,
-                'message': 'No location detected in tweet',
-                'tweet': tweet
-            }), 200
+        db = get_db()
+        result, disaster_event = analyze_tweet(db, tweet, location, lambda: get_hubs_cached(db))
         
-        # Geocode location
-        coords = geocode_location(location)
+        # Save disaster event
+        if disaster_event is not None:
+            db.commit()
+            result['event_id'] = disaster_event.id
         
-        if not coords:
-            return jsonify({
-                'success': False,
-                'message': f'Could not geocode location: {location}',
-                'detected_location': location,
-                'tweet': tweet
-            }), 200
+        return jsonify(result), 200
         
-        latitude, longitude = coords
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/predict-location/result/<task_id>', methods=['GET'])
+def predict_location_result(task_id):
+    """
+    Status and result of a queued predict-location task
+    Output: {"task_id": ..., "status": "queued|started|finished|failed", "result": {...}}
+    (for a queued batch, result is the list of per-tweet results)
+    """
+    if task_queue is None:
+        return jsonify({'error': 'Background processing is not enabled'}), 404
+    
+    try:
+        job = Job.fetch(task_id, connection=task_queue.connection)
+    except NoSuchJobError:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    status = job.get_status()
+    response = {
+        'task_id': job.id,
+        'status': status,
+        'result': job.result if status == JobStatus.FINISHED else None
+    }
+    if status == JobStatus.FAILED:
+        response['error'] = 'Task failed'
+    
+    return jsonify(response), 200
+
+
+@app.route('/api/predict-location/batch', methods=['POST'])
+def predict_location_batch():
+    """
+    Predict locations for many disaster tweets in one call
+    Input: {"tweets": ["Earthquake hits Tokyo", "Flooding in Chennai"]}
+    Output: {"success": true, "results": [<predict-location result per tweet>, ...]}
+    At most MAX_BATCH_GEOCODE_LOOKUPS locations missing from the geocode cache
+    are looked up per call; tweets naming the others report that their
+    location could not be geocoded
+    With REDIS_URL set, batches over MAX_BATCH_TWEETS are queued as one job
+    instead of rejected: {"task_id": ...} (202), whose result is the results list
+    """
+    try:
+        data = request.get_json()
+        tweets = data.get('tweets', [])
         
-        # Get nearby hubs
-        db = get_db()
-        all_hubs = db.query(Hub).all()
-        hubs_list = [hub.to_dict() for hub in all_hubs]
-        nearby_hubs = find_nearby_hubs((latitude, longitude), hubs_list, max_distance_km=100)
+        if not tweets or not isinstance(tweets, list):
+            return jsonify({'error': 'A non-empty list of tweets is required'}), 400
+        if len(tweets) > MAX_BATCH_TWEETS and task_queue is None:
+            return jsonify({'error': f'At most {MAX_BATCH_TWEETS} tweets per batch'}), 400
         
-        # Classify disaster type and severity
-        disaster_type = classify_disaster_type(tweet)
-        severity = assess_severity(tweet)
+        tweets = [str(tweet) for tweet in tweets]
         
-        # Save disaster event
-        disaster_event = DisasterEvent(
-            tweet_text=tweet,
-            detected_location=location,
-            latitude=latitude,
-            longitude=longitude,
-            disaster_type=disaster_type,
-            severity=severity,
-            nearby_hubs_count=len(nearby_hubs)
-        )
-        db.add(disaster_event)
-        db.commit()
-        db.refresh(disaster_event)
+        if len(tweets) > MAX_BATCH_TWEETS:
+            job = task_queue.enqueue(process_tweets, tweets, job_timeout=BATCH_JOB_TIMEOUT)
+            return jsonify({'success': True, 'task_id': job.id, 'status': job.get_status()}), 202
         
-        # Get the event_id before closing the session
-        event_id = disaster_event.id
+        # Extract locations for all tweets through one batched NER pipe
+        locations = list(extract_locations_from_tweets(tweets))
         
-        db.close()
+        # Geocode the distinct locations together and save in one commit
+        db = get_db()
+        results = analyze_tweets(
+            db, tweets, locations, lambda: get_hubs_cached(db), max_lookups=MAX_BATCH_GEOCODE_LOOKUPS
+        )
         
-        return jsonify({
-            'success': True,
-            'detected_location': location,
-            'latitude': latitude,
-            'longitude': longitude,
-            'disaster_type': disaster_type,
-            'severity': severity,
-            'nearby_hubs': nearby_hubs,
-            'tweet': tweet,
-            'event_id': event_id
-        }), 200
+        return jsonify({'success': True, 'results': results}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -206,10 +371,10 @@ def manage_hubs():
     
     try:
         if request.method == 'GET':
-            hubs = db.query(Hub).all()
+            hubs = db.execute(select(*HUB_COLUMNS))
             return jsonify({
                 'success': True,
-                'hubs': [hub.to_dict() for hub in hubs]
+                'hubs': [HubRow(*hub) for hub in hubs]
             }), 200
         
         elif request.method == 'POST':
@@ -242,7 +407,7 @@ def manage_hubs():
             
             db.add(hub)
             db.commit()
-            db.refresh(hub)
+            invalidate_hubs_cache()
             
             return jsonify({
                 'success': True,
@@ -253,8 +418,6 @@ def manage_hubs():
     except Exception as e:
         db.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 @app.route('/api/admin/hubs/<int:hub_id>', methods=['PUT', 'DELETE'])
@@ -292,7 +455,7 @@ def update_delete_hub(hub_id):
                 hub.contact = data['contact']
             
             db.commit()
-            db.refresh(hub)
+            invalidate_hubs_cache()
             
             return jsonify({
                 'success': True,
@@ -303,6 +466,7 @@ def update_delete_hub(hub_id):
         elif request.method == 'DELETE':
             db.delete(hub)
             db.commit()
+            invalidate_hubs_cache()
             
             return jsonify({
                 'success': True,
@@ -312,8 +476,6 @@ def update_delete_hub(hub_id):
     except Exception as e:
         db.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 @app.route('/api/donations', methods=['GET', 'POST'])
@@ -326,10 +488,10 @@ def manage_donations():
     
     try:
         if request.method == 'GET':
-            donations = db.query(Donation).all()
+            donations = db.execute(select(*DONATION_COLUMNS)).all()
             return jsonify({
                 'success': True,
-                'donations': [donation.to_dict() for donation in donations]
+                'donations': attach_tracking_history(db, [DonationRow(*donation) for donation in donations])
             }), 200
         
         elif request.method == 'POST':
@@ -349,7 +511,6 @@ def manage_donations():
             
             db.add(donation)
             db.commit()
-            db.refresh(donation)
             
             return jsonify({
                 'success': True,
@@ -360,8 +521,6 @@ def manage_donations():
     except Exception as e:
         db.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 @app.route('/api/admin/donations', methods=['GET'])
@@ -375,12 +534,26 @@ def admin_list_donations():
 
     db = get_db()
     try:
-        donations = db.query(Donation).order_by(Donation.created_at.desc()).all()
-        return jsonify({'success': True, 'donations': [d.to_dict() for d in donations]}), 200
+        donations = db.execute(
+            select(*DONATION_COLUMNS)
+            .order_by(Donation.created_at.desc())
+            .execution_options(yield_per=DONATION_STREAM_BATCH)
+        )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
+
+    def generate():
+        # Stream the JSON array one fetched batch at a time
+        yield b'{"success":true,"donations":['
+        first = True
+        for batch in donations.partitions():
+            rows = attach_tracking_history(db, [DonationRow(*d) for d in batch])
+            chunk = b','.join(app.json.dumpb(d) for d in rows)
+            yield chunk if first else b',' + chunk
+            first = False
+        yield b']}'
+
+    return Response(stream_with_context(generate()), 200, mimetype='application/json')
 
 
 @app.route('/api/admin/donations/<int:donation_id>', methods=['PUT'])
@@ -409,28 +582,20 @@ def admin_update_donation(donation_id):
         # Append tracking history entry if provided
         tracking_note = data.get('tracking_note')
         if tracking_note:
-            entry = {
-                'status': donation.tracking_status,
-                'note': tracking_note,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            # include hub id when given
-            if 'hub_id' in data:
-                entry['hub_id'] = data.get('hub_id')
-
-            history = donation.tracking_history or []
-            history.append(entry)
-            donation.tracking_history = history
+            # Insert a row rather than rewriting the whole JSON history
+            db.add(DonationTracking(
+                donation_id=donation.id,
+                status=donation.tracking_status,
+                note=tracking_note,
+                hub_id=data.get('hub_id')  # include hub id when given
+            ))
 
         db.commit()
-        db.refresh(donation)
 
         return jsonify({'success': True, 'donation': donation.to_dict()}), 200
     except Exception as e:
         db.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 @app.route('/api/victim-requests', methods=['GET', 'POST'])
@@ -443,10 +608,10 @@ def manage_victim_requests():
     
     try:
         if request.method == 'GET':
-            requests_query = db.query(VictimRequest).all()
+            requests_query = db.execute(select(*VICTIM_REQUEST_COLUMNS))
             return jsonify({
                 'success': True,
-                'requests': [req.to_dict() for req in requests_query]
+                'requests': [VictimRequestRow(*req) for req in requests_query]
             }), 200
         
         elif request.method == 'POST':
@@ -474,12 +639,10 @@ def manage_victim_requests():
             
             db.add(victim_request)
             db.commit()
-            db.refresh(victim_request)
             
             # Try to match with best hub
             if latitude and longitude:
-                all_hubs = db.query(Hub).all()
-                hubs_list = [hub.to_dict() for hub in all_hubs]
+                hubs_list = get_hubs_cached(db)
                 best_hub = find_best_hub_for_request(
                     (latitude, longitude),
                     data.get('requested_items', {}),
@@ -505,8 +668,6 @@ def manage_victim_requests():
     except Exception as e:
         db.rollback()
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 @app.route('/api/dashboard/stats', methods=['GET'])
@@ -515,14 +676,13 @@ def get_dashboard_stats():
     db = get_db()
     
     try:
-        total_hubs = db.query(Hub).count()
-        total_donations = db.query(Donation).count()
-        total_requests = db.query(VictimRequest).count()
-        total_events = db.query(DisasterEvent).count()
-        
-        pending_requests = db.query(VictimRequest).filter(
-            VictimRequest.fulfilled_status == 'pending'
-        ).count()
+        counts = db.execute(select(
+            _count(Hub).label('total_hubs'),
+            _count(Donation).label('total_donations'),
+            _count(VictimRequest).label('total_requests'),
+            _count(DisasterEvent).label('total_events'),
+            _count(VictimRequest, VictimRequest.fulfilled_status == 'pending').label('pending_requests')
+        )).one()
         
         recent_events = db.query(DisasterEvent).order_by(
             DisasterEvent.created_at.desc()
@@ -530,21 +690,14 @@ def get_dashboard_stats():
         
         return jsonify({
             'success': True,
-            'stats': {
-                'total_hubs': total_hubs,
-                'total_donations': total_donations,
-                'total_requests': total_requests,
-                'total_events': total_events,
-                'pending_requests': pending_requests
-            },
+            'stats': dict(counts._mapping),
             'recent_events': [event.to_dict() for event in recent_events]
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        db.close()
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(debug=os.getenv('FLASK_ENV') == 'development', host='0.0.0.0', port=5000)
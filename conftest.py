@@ -0,0 +1,6 @@
+"""
+Test configuration: run against an in-memory database
+"""
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration for the disaster relief API
+Run with: gunicorn app:app
+"""
+# The app is imported in the master before forking (preload_app), so patch
+# blocking IO first or modules like ssl/requests get imported unpatched
+from gevent import monkey
+monkey.patch_all()
+
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# gevent workers patch blocking IO (geocoding, DB) so one slow request
+# does not stall the rest of the worker
+worker_class = 'gevent'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+
+# Import the app (and load the spaCy model) once in the master; workers
+# share the loaded pages copy-on-write instead of each loading their own.
+# A CUDA context does not survive fork, so GPU NER loads per worker instead
+preload_app = os.getenv('DISASTER_NER_GPU') != '1'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperate with gevent in each worker"""
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+    
+    # Connections opened by the master during startup must not be shared
+    # across processes; leave them to the master and start a fresh pool
+    from models import engine
+    engine.dispose(close=False)
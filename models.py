@@ -1,10 +1,13 @@
 """
 Database models for disaster relief management system
 """
+from dataclasses import make_dataclass
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, Text, JSON
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Boolean, Text, JSON, Index, ForeignKey
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship
 import os
 from dotenv import load_dotenv
 
@@ -34,7 +37,7 @@ class Hub(Base):
             'longitude': self.longitude,
             'inventory': self.inventory or {},
             'contact': self.contact,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
 
 
@@ -56,8 +59,11 @@ class Donation(Base):
     payment_info = Column(JSON, default=dict)
     # Tracking: current status and history for delivery (admin updates)
     tracking_status = Column(String(50), default='pending')
+    # Legacy history written before donation_tracking existed; no longer appended to
     tracking_history = Column(JSON, default=list)  # list of {status, note, timestamp, hub_id}
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    tracking_entries = relationship('DonationTracking', order_by='DonationTracking.id')
     
     def to_dict(self):
         return {
@@ -73,11 +79,39 @@ class Donation(Base):
             'notes': self.notes,
             'payment_info': self.payment_info or {},
             'tracking_status': self.tracking_status,
-            'tracking_history': self.tracking_history or [],
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'tracking_history': (self.tracking_history or []) + [
+                entry.to_dict() for entry in self.tracking_entries
+            ],
+            'created_at': self.created_at
         }
 
 
+class DonationTracking(Base):
+    """Delivery tracking history entries for donations (admin updates)"""
+    __tablename__ = 'donation_tracking'
+    
+    id = Column(Integer, primary_key=True)
+    donation_id = Column(Integer, ForeignKey('donations.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = Column(String(50))
+    note = Column(Text)
+    hub_id = Column(Integer, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return tracking_entry(self.status, self.note, self.timestamp, self.hub_id)
+
+
+def tracking_entry(status, note, timestamp, hub_id=None):
+    """Tracking history entry in the same shape as the legacy JSON entries"""
+    # Legacy entries hold naive datetime.utcnow().isoformat() strings
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat()
+    entry = {'status': status, 'note': note, 'timestamp': timestamp}
+    if hub_id is not None:
+        entry['hub_id'] = hub_id
+    return entry
+
+
 class VictimRequest(Base):
     """Requests from victims/affected people"""
     __tablename__ = 'victim_requests'
@@ -94,9 +128,14 @@ class VictimRequest(Base):
     fulfilled_by_hub_id = Column(Integer, nullable=True)
     fulfilled_by_donation_id = Column(Integer, nullable=True)
     notes = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Serves "pending requests" counts/listings, newest first
+    __table_args__ = (
+        Index('ix_victim_pending_recent', fulfilled_status, created_at.desc()),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -111,8 +150,8 @@ class VictimRequest(Base):
             'fulfilled_by_hub_id': self.fulfilled_by_hub_id,
             'fulfilled_by_donation_id': self.fulfilled_by_donation_id,
             'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 
@@ -128,7 +167,7 @@ class DisasterEvent(Base):
     disaster_type = Column(String(100))  # earthquake, flood, hurricane, etc.
     severity = Column(String(20))  # low, medium, high, critical
     nearby_hubs_count = Column(Integer, default=0)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     
     def to_dict(self):
         return {
@@ -140,24 +179,104 @@ class DisasterEvent(Base):
             'disaster_type': self.disaster_type,
             'severity': self.severity,
             'nearby_hubs_count': self.nearby_hubs_count,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
 
 
+class GeocodeCache(Base):
+    """Persistent geocoding results keyed by normalized location name"""
+    __tablename__ = 'geocode_cache'
+    
+    normalized_key = Column(String(255), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Column projections for read-only list endpoints (Core selects, no ORM instances)
+HUB_COLUMNS = (
+    Hub.id, Hub.name, Hub.location_name, Hub.latitude, Hub.longitude,
+    Hub.inventory, Hub.contact, Hub.created_at
+)
+DONATION_COLUMNS = (
+    Donation.id, Donation.donor_name, Donation.donor_email, Donation.donor_phone,
+    Donation.items, Donation.amount, Donation.allocated_status,
+    Donation.allocated_to_victim_id, Donation.allocated_to_hub_id, Donation.notes,
+    Donation.payment_info, Donation.tracking_status, Donation.tracking_history,
+    Donation.created_at
+)
+DONATION_TRACKING_COLUMNS = (
+    DonationTracking.donation_id, DonationTracking.status, DonationTracking.note,
+    DonationTracking.timestamp, DonationTracking.hub_id
+)
+VICTIM_REQUEST_COLUMNS = (
+    VictimRequest.id, VictimRequest.victim_name, VictimRequest.victim_phone,
+    VictimRequest.location_name, VictimRequest.latitude, VictimRequest.longitude,
+    VictimRequest.requested_items, VictimRequest.urgency, VictimRequest.fulfilled_status,
+    VictimRequest.fulfilled_by_hub_id, VictimRequest.fulfilled_by_donation_id,
+    VictimRequest.notes, VictimRequest.created_at, VictimRequest.updated_at
+)
+
+
+def _row_class(name, columns, defaults=None):
+    """
+    Slotted dataclass with one field per selected column; defaults maps
+    fields to factories replacing empty values, as the to_dict() methods do
+    """
+    namespace = {}
+    if defaults:
+        def __post_init__(self):
+            for field, factory in defaults.items():
+                if not getattr(self, field):
+                    setattr(self, field, factory())
+        namespace['__post_init__'] = __post_init__
+    return make_dataclass(name, [column.key for column in columns], slots=True, namespace=namespace)
+
+
+# Lightweight row objects for list endpoints; orjson serializes dataclasses natively
+HubRow = _row_class('HubRow', HUB_COLUMNS, {'inventory': dict})
+DonationRow = _row_class('DonationRow', DONATION_COLUMNS, {
+    'items': dict, 'payment_info': dict, 'tracking_history': list
+})
+VictimRequestRow = _row_class('VictimRequestRow', VICTIM_REQUEST_COLUMNS, {'requested_items': dict})
+
 # Database engine and session
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///disaster_relief.db')
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
+_url = make_url(DATABASE_URL)
+IS_SQLITE = _url.get_backend_name() == 'sqlite'
+
+engine_options = {'echo': False, 'pool_pre_ping': True}
+if IS_SQLITE:
+    engine_options['connect_args'] = {'check_same_thread': False}
+if IS_SQLITE and _url.database in (None, '', ':memory:'):
+    # In-memory databases (tests) must share a single connection
+    engine_options['poolclass'] = StaticPool
+else:
+    # Size to the greenlets per worker that may hold a connection at once
+    engine_options['pool_size'] = int(os.getenv('DB_POOL_SIZE', '10'))
+    engine_options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+
+engine = create_engine(DATABASE_URL, **engine_options)
+# Keep loaded values after commit: defaults are applied client-side and the
+# primary key is set on flush, so re-reading written rows is unnecessary
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL lets readers proceed while a write commits"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
 
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(engine)
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
     print("✅ Database tables created successfully")
-
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        pass  # Don't close here, let the caller handle it
@@ -0,0 +1,140 @@
+"""
+Tweet processing shared by the API and the background worker
+Run the worker with: python worker.py
+"""
+import os
+
+from models import SessionLocal, Hub, DisasterEvent
+from utils.disaster_utils import (
+    extract_locations_bulk,
+    extract_locations_from_tweets,
+    geocode_location,
+    geocode_many,
+    find_nearby_hubs,
+    classify_tweet
+)
+
+# Queued batches at least this large are parsed by several NER processes
+BULK_MIN_TWEETS = int(os.getenv('BULK_MIN_TWEETS', '2000'))
+
+
+def analyze_tweet(db, tweet, location, load_hubs, geocode=geocode_location):
+    """
+    Geocode the location detected in a tweet, find nearby hubs and add a
+    DisasterEvent to the session (the caller commits)
+    geocode maps a location name to (latitude, longitude) or None; batch
+    callers pass lookups resolved up front
+    Returns: (result dict, DisasterEvent or None when nothing was saved)
+    """
+    if not location:
+        return {
+            'success': False,
+            'message': 'No location detected in tweet',
+            'tweet': tweet
+        }, None
+    
+    # Geocode location
+    coords = geocode(location)
+    
+    if not coords:
+        return {
+            'success': False,
+            'message': f'Could not geocode location: {location}',
+            'detected_location': location,
+            'tweet': tweet
+        }, None
+    
+    latitude, longitude = coords
+    
+    # Get nearby hubs
+    nearby_hubs = find_nearby_hubs((latitude, longitude), load_hubs(), max_distance_km=100)
+    
+    # Classify disaster type and severity
+    disaster_type, severity = classify_tweet(tweet)
+    
+    disaster_event = DisasterEvent(
+        tweet_text=tweet,
+        detected_location=location,
+        latitude=latitude,
+        longitude=longitude,
+        disaster_type=disaster_type,
+        severity=severity,
+        nearby_hubs_count=len(nearby_hubs)
+    )
+    db.add(disaster_event)
+    
+    return {
+        'success': True,
+        'detected_location': location,
+        'latitude': latitude,
+        'longitude': longitude,
+        'disaster_type': disaster_type,
+        'severity': severity,
+        'nearby_hubs': nearby_hubs,
+        'tweet': tweet
+    }, disaster_event
+
+
+def analyze_tweets(db, tweets, locations, load_hubs, max_lookups=None):
+    """
+    analyze_tweet for a batch of tweets and their detected locations: the
+    locations are geocoded together (cached, then rate-limited; at most
+    max_lookups uncached ones) and all events are saved in one commit
+    Returns: list of result dicts, one per tweet
+    """
+    found = [location for location in locations if location]
+    coords_by_location = dict(zip(found, geocode_many(found, max_lookups=max_lookups)))
+    
+    results = []
+    saved = []
+    for tweet, location in zip(tweets, locations):
+        result, disaster_event = analyze_tweet(
+            db, tweet, location, load_hubs, geocode=coords_by_location.get
+        )
+        results.append(result)
+        if disaster_event is not None:
+            saved.append((result, disaster_event))
+    
+    if saved:
+        db.commit()
+        for result, disaster_event in saved:
+            result['event_id'] = disaster_event.id
+    
+    return results
+
+
+def process_tweets(tweets):
+    """
+    Background job: run the predict-location pipeline for a list of tweets
+    through one batched NER pass (over several processes for large ingests)
+    and save the detected disaster events
+    """
+    db = SessionLocal()
+    hubs = None
+    
+    def load_hubs():
+        # One hub query per job, however many tweets it holds
+        nonlocal hubs
+        if hubs is None:
+            hubs = [hub.to_dict() for hub in db.query(Hub).all()]
+        return hubs
+    
+    try:
+        if len(tweets) >= BULK_MIN_TWEETS:
+            locations = extract_locations_bulk(tweets)
+        else:
+            locations = list(extract_locations_from_tweets(tweets))
+        return analyze_tweets(db, tweets, locations, load_hubs)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def process_tweet(tweet):
+    """
+    Background job: run the full predict-location pipeline for one tweet
+    and save the detected disaster event
+    """
+    return process_tweets([tweet])[0]
@@ -0,0 +1,39 @@
+"""
+classify_tweet checked against classify_disaster_type and assess_severity
+"""
+import random
+
+from utils.disaster_utils import (
+    DISASTER_KEYWORDS,
+    SEVERITY_KEYWORDS,
+    assess_severity,
+    classify_disaster_type,
+    classify_tweet
+)
+
+KEYWORDS = [word for _, words in DISASTER_KEYWORDS + SEVERITY_KEYWORDS for word in words]
+# Case variants, non-ASCII case folds and filler around the keywords
+EXTRA_WORDS = ['Fire', 'DEAD', 'Severe FLOOD', 'ſevere', 'KİLLED', 'near', 'xyz', '']
+
+
+def _random_tweet(rng):
+    words = KEYWORDS + EXTRA_WORDS
+    return ''.join(
+        rng.choice(words) + rng.choice(['', ' ', ', ', '!'])
+        for _ in range(rng.randint(0, 6))
+    )
+
+
+def test_matches_separate_classifiers():
+    rng = random.Random(5)
+    for _ in range(5000):
+        tweet = _random_tweet(rng)
+        expected = (classify_disaster_type(tweet), assess_severity(tweet))
+        assert classify_tweet(tweet) == expected, tweet
+
+
+def test_every_keyword_alone():
+    for word in KEYWORDS:
+        for tweet in (word, word.upper(), f"reports of {word} downtown"):
+            expected = (classify_disaster_type(tweet), assess_severity(tweet))
+            assert classify_tweet(tweet) == expected, tweet
@@ -0,0 +1,76 @@
+"""
+find_best_hub_for_request checked against the original per-hub loop
+"""
+import random
+
+from utils.disaster_utils import calculate_distance, find_best_hub_for_request
+
+ITEMS = ['water', 'food', 'medicine', 'blanket', 'tent']
+
+
+def _match_score(requested, available):
+    """Per-item match score (0-100) as originally computed"""
+    total_requested = sum(requested.values())
+    matched = sum(
+        min(quantity, available[item])
+        for item, quantity in requested.items()
+        if item in available and available[item] > 0
+    )
+    return matched / total_requested * 100
+
+
+def reference_best_hub(location, requested_items, hubs):
+    """The original loop: score every hub within 100 km, keep the first best"""
+    if not hubs or not requested_items:
+        return None
+    best = None
+    for hub in hubs:
+        distance = calculate_distance(location, (hub['latitude'], hub['longitude']))
+        if distance > 100:
+            continue
+        match_score = _match_score(requested_items, hub.get('inventory', {}))
+        if match_score == 0:
+            continue
+        combined_score = round(match_score * 0.7 + (100 / (1 + distance)) * 0.3, 1)
+        if best is None or combined_score > best[0]:
+            best = (combined_score, hub['id'], round(match_score, 1), round(distance, 2))
+    return best
+
+
+def _random_hubs(rng, count):
+    return [
+        {
+            'id': i,
+            'latitude': 13 + rng.uniform(-1.5, 1.5),
+            'longitude': 80 + rng.uniform(-1.5, 1.5),
+            'inventory': {item: rng.randint(-1, 6) for item in rng.sample(ITEMS, rng.randint(0, 5))}
+        }
+        for i in range(count)
+    ]
+
+
+def test_matches_reference_loop():
+    rng = random.Random(2)
+    # Sizes on both sides of HUB_TREE_MIN_SIZE (linear scan and BallTree)
+    for _ in range(300):
+        hubs = _random_hubs(rng, rng.choice([3, 40, 200]))
+        requested = {item: rng.randint(1, 5) for item in rng.sample(ITEMS + ['unknown'], rng.randint(0, 3))}
+        location = (13 + rng.uniform(-1, 1), 80 + rng.uniform(-1, 1))
+        
+        expected = reference_best_hub(location, requested, hubs)
+        best = find_best_hub_for_request(location, requested, hubs)
+        
+        if expected is None:
+            assert best is None
+            continue
+        assert (best['combined_score'], best['id'], best['match_score']) == expected[:3]
+        assert abs(best['distance_km'] - expected[3]) <= 0.01
+
+
+def test_ties_go_to_earlier_hub():
+    for count in (10, 100):
+        hubs = [
+            {'id': i, 'latitude': 13.0, 'longitude': 80.0, 'inventory': {'water': 5}}
+            for i in range(count)
+        ]
+        assert find_best_hub_for_request((13.01, 80.0), {'water': 1}, hubs)['id'] == 0
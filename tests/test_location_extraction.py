@@ -0,0 +1,54 @@
+"""
+_pipe_locations merging gazetteer hits with NER results in input order
+"""
+import pytest
+
+import utils.disaster_utils as disaster_utils
+from utils.disaster_utils import _first_location, _pipe_locations, get_location_matcher, get_nlp
+
+GAZETTEER = ['Tokyo', 'Chennai', 'New York City']
+MISSES = ['Fire near Mumbai', 'nothing to report', 'help needed in Mumbai now', '']
+
+
+@pytest.fixture
+def gazetteer(tmp_path, monkeypatch):
+    path = tmp_path / 'gazetteer.txt'
+    path.write_text('\n'.join(GAZETTEER) + '\n', encoding='utf-8')
+    monkeypatch.setattr(disaster_utils, 'LOCATION_GAZETTEER', str(path))
+    get_location_matcher.cache_clear()
+    yield
+    get_location_matcher.cache_clear()
+
+
+def _expected(tweet):
+    """Gazetteer place named in the tweet, else what the NER model finds"""
+    for place in GAZETTEER:
+        start = tweet.lower().find(place.lower())
+        if start >= 0:
+            return tweet[start:start + len(place)]
+    return _first_location(get_nlp()(tweet))
+
+
+@pytest.mark.parametrize('tweets', [
+    # Leading hit, alternating, then a trailing run of hits
+    ['Flood in TOKYO', MISSES[0], 'storm over Chennai', MISSES[1], MISSES[2],
+     'quake hits new york city', 'Tokyo again', 'Chennai too'],
+    # Leading run of misses, hits in the middle, trailing miss
+    MISSES + ['Tokyo', 'Chennai'] + MISSES[:1],
+    # Only hits: nothing reaches the model
+    ['Tokyo', 'chennai floods', 'New York City'],
+    # Only misses
+    MISSES,
+    [],
+])
+@pytest.mark.parametrize('batch_size', [1, 2, 128])
+def test_results_stay_in_input_order(gazetteer, tweets, batch_size):
+    assert get_location_matcher() is not None
+    expected = [_expected(tweet) for tweet in tweets]
+    assert list(_pipe_locations(iter(tweets), batch_size, 1)) == expected
+
+
+def test_gazetteer_hit_wins_over_the_model(gazetteer):
+    # The model alone answers Mumbai; the gazetteer short-circuits it
+    assert _first_location(get_nlp()('Fire near Mumbai and Tokyo')) == 'Mumbai'
+    assert list(_pipe_locations(['Fire near Mumbai and Tokyo'], 8, 1)) == ['Tokyo']
@@ -2,31 +2,374 @@
 Utility functions for disaster relief system
 """
 import spacy
+from spacy.matcher import PhraseMatcher
+from geopy.adapters import RequestsAdapter
+from geopy.extra.rate_limiter import RateLimiter
 from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
-from typing import List, Dict, Tuple, Optional
+from sqlalchemy.exc import IntegrityError
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Callable
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
 import os
+import re
+import threading
+import time
+import numpy as np
+from models import SessionLocal, GeocodeCache, Hub, DisasterEvent
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:
+    BallTree = None
 
-# Load spaCy model
-MODEL_PATH = os.getenv('MODEL_PATH', 'disaster_ner_model')
 try:
-    nlp = spacy.load(MODEL_PATH)
-    print(f"✅ Loaded custom NER model from {MODEL_PATH}")
-except:
-    print(f"⚠️ Could not load model from {MODEL_PATH}, using default")
-    nlp = spacy.load("en_core_web_sm")
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# spaCy model; loaded once by get_nlp() (in the gunicorn master when
+# preloading, then shared copy-on-write with the forked workers)
+MODEL_PATH = os.getenv('MODEL_PATH', 'disaster_ner_model')
+
+# Location extraction only reads entities, so the other components are
+# excluded at load time (not loaded at all, unlike disable)
+NER_ONLY_EXCLUDE = ["tagger", "parser", "lemmatizer", "attribute_ruler", "tok2vec"]
+# en_core_web_sm fallback: keep tok2vec in case ner listens to it
+DEFAULT_MODEL_EXCLUDE = ["tagger", "parser", "lemmatizer", "attribute_ruler"]
+
+# Optional gazetteer file (one place name per line); tweets naming one of
+# these places skip the NER model
+LOCATION_GAZETTEER = os.getenv('LOCATION_GAZETTEER')
+
+# Opt-in GPU NER for high-volume ingest (needs torch with CUDA); a
+# transformer pipeline can be supplied for it through GPU_MODEL_PATH
+NER_GPU = os.getenv('DISASTER_NER_GPU') == '1'
+GPU_MODEL_PATH = os.getenv('GPU_MODEL_PATH', MODEL_PATH)
+
+# nlp.pipe settings for batched NER; smaller batches keep GPU memory in check
+SPACY_BATCH_SIZE = int(os.getenv('SPACY_BATCH_SIZE', '64' if NER_GPU else '128'))
+SPACY_N_PROCESS = int(os.getenv('SPACY_N_PROCESS', '1'))
+
+# Initialize geocoder; the requests adapter keeps one pooled session so
+# repeated lookups reuse the TLS connection to Nominatim
+GEOCODER_POOL_SIZE = int(os.getenv('GEOCODER_POOL_SIZE', '10'))
+geolocator = Nominatim(
+    user_agent="disaster_relief_system",
+    adapter_factory=partial(
+        RequestsAdapter,
+        pool_connections=1,
+        pool_maxsize=GEOCODER_POOL_SIZE
+    )
+)
+
+# Every Nominatim lookup, single or bulk, goes through one rate limiter
+# (usage policy: at most one request per second); failed lookups come back
+# as None. The limiter is per process, so with several gunicorn or RQ
+# workers set GEOCODE_MIN_DELAY to the number of processes (in seconds).
+GEOCODE_WORKERS = int(os.getenv('GEOCODE_WORKERS', '8'))
+GEOCODE_MIN_DELAY = float(os.getenv('GEOCODE_MIN_DELAY', '1.0'))
+_rate_limited_geocode = RateLimiter(
+    partial(geolocator.geocode, timeout=10),
+    min_delay_seconds=GEOCODE_MIN_DELAY,
+    swallow_exceptions=True
+)
+
+# In-process LRU size and lifetime of rows in the geocode_cache table
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', '10000'))
+GEOCODE_CACHE_TTL = timedelta(days=int(os.getenv('GEOCODE_CACHE_TTL_DAYS', '30')))
+
+# The in-process LRU only holds successful lookups, each for at most
+# GEOCODE_MEMORY_TTL seconds, so rows expiring from the table are re-read
+GEOCODE_MEMORY_TTL = int(os.getenv('GEOCODE_MEMORY_TTL', '3600'))
+_geocode_memory = OrderedDict()  # key -> (coords, expires_at)
+_geocode_memory_lock = threading.Lock()
+
+EARTH_RADIUS_KM = 6371.0
+
+# Below this many hubs a linear NumPy scan beats building/querying a BallTree
+HUB_TREE_MIN_SIZE = 64
+
+# Hub coordinates (radians) and spatial index for the last hub list seen;
+# cleared on hub CRUD
+_hub_index = {'hubs': None, 'coords': None, 'tree': None, 'inventory': None, 'items': None}
+
+
+@lru_cache(maxsize=1)
+def ner_on_gpu() -> bool:
+    """
+    Switch spaCy to the GPU when DISASTER_NER_GPU=1 and CUDA is available
+    """
+    if not NER_GPU:
+        return False
+    try:
+        import torch
+    except ImportError:
+        print("⚠️ DISASTER_NER_GPU=1 but torch is not installed, running NER on CPU")
+        return False
+    if not torch.cuda.is_available():
+        print("⚠️ DISASTER_NER_GPU=1 but no CUDA device is available, running NER on CPU")
+        return False
+    try:
+        spacy.require_gpu()  # Needs cupy, which torch does not bring along
+    except Exception as e:
+        print(f"⚠️ DISASTER_NER_GPU=1 but spaCy could not use the GPU ({e}), running NER on CPU")
+        return False
+    return True
+
+
+@lru_cache(maxsize=1)
+def get_nlp():
+    """
+    Return the shared spaCy pipeline, loading it on first use
+    """
+    model_path = GPU_MODEL_PATH if ner_on_gpu() else MODEL_PATH
+    try:
+        nlp = spacy.load(model_path, exclude=NER_ONLY_EXCLUDE)
+        print(f"✅ Loaded custom NER model from {model_path}")
+    except Exception:
+        print(f"⚠️ Could not load model from {model_path}, using default")
+        nlp = spacy.load("en_core_web_sm", exclude=DEFAULT_MODEL_EXCLUDE)
+    return nlp
+
+
+@lru_cache(maxsize=1)
+def get_location_matcher() -> Optional[PhraseMatcher]:
+    """
+    Return a case-insensitive PhraseMatcher over the LOCATION_GAZETTEER
+    place names, or None when no gazetteer is configured
+    """
+    if not LOCATION_GAZETTEER:
+        return None
+    try:
+        with open(LOCATION_GAZETTEER, encoding='utf-8') as gazetteer:
+            names = {' '.join(line.split()) for line in gazetteer} - {''}
+    except OSError as e:
+        print(f"⚠️ Could not read gazetteer {LOCATION_GAZETTEER}: {e}")
+        return None
+    
+    nlp = get_nlp()
+    matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+    matcher.add("LOC", list(nlp.tokenizer.pipe(sorted(names))))
+    print(f"✅ Loaded {len(names)} gazetteer locations from {LOCATION_GAZETTEER}")
+    return matcher
+
+
+def warmup_nlp() -> None:
+    """
+    Load the spaCy pipeline (and gazetteer) and run one document through it
+    so the first request does not pay the start-up cost
+    """
+    get_location_matcher()
+    get_nlp()("warmup")
+
+
+def _first_location(doc) -> Optional[str]:
+    """
+    Return the text of the first LOC/GPE entity in a parsed doc
+    """
+    for ent in doc.ents:
+        if ent.label_ in ("LOC", "GPE"):
+            return ent.text
+    return None
+
+
+def _gazetteer_location(matcher: PhraseMatcher, doc) -> Optional[str]:
+    """
+    Return the earliest (then longest) gazetteer place named in a tokenized doc
+    """
+    spans = matcher(doc, as_spans=True)
+    if not spans:
+        return None
+    return min(spans, key=lambda span: (span.start, -len(span))).text
+
+
+def _pipe_locations(tweets: Iterable[str], batch_size: int, n_process: int) -> Iterator[Optional[str]]:
+    """
+    Yield the first location of each tweet, in order. With a gazetteer, tweets
+    naming a known place are answered from the tokenizer alone and only the
+    rest are run through the NER model.
+    """
+    nlp = get_nlp()
+    matcher = get_location_matcher()
+    if matcher is None:
+        for doc in nlp.pipe(tweets, batch_size=batch_size, n_process=n_process):
+            yield _first_location(doc)
+        return
+    
+    # Gazetteer hits, with None marking tweets that were sent to the model
+    pending = deque()
+    
+    def misses():
+        for tweet in tweets:
+            doc = nlp.make_doc(tweet)
+            location = _gazetteer_location(matcher, doc)
+            pending.append(location)
+            if location is None:
+                yield doc
+    
+    for doc in nlp.pipe(misses(), batch_size=batch_size, n_process=n_process):
+        while pending[0] is not None:
+            yield pending.popleft()
+        pending.popleft()
+        yield _first_location(doc)
+    yield from pending
 
-# Initialize geocoder
-geolocator = Nominatim(user_agent="disaster_relief_system")
+
+def extract_locations_from_tweets(tweets: Iterable[str],
+                                  n_process: Optional[int] = None) -> Iterator[Optional[str]]:
+    """
+    Extract the first location from each tweet using the trained NER model.
+    Tweets are parsed in batches with nlp.pipe; yields one result per tweet.
+    """
+    n_process = n_process or SPACY_N_PROCESS
+    yield from _pipe_locations(tweets, SPACY_BATCH_SIZE, 1 if ner_on_gpu() else n_process)
+
+
+def extract_locations_bulk(tweets: Iterable[str], n_process: Optional[int] = None,
+                           batch_size: int = 256) -> List[Optional[str]]:
+    """
+    Extract the first location from each tweet of a large ingest using
+    several worker processes (default: half the CPU cores).
+    Workers receive batch_size tweets at a time: bigger batches amortize the
+    inter-process transfer, but leave workers idle unless there are well over
+    n_process * batch_size tweets. Starting the workers costs far more than
+    parsing a few tweets, so request handlers use extract_locations_from_tweets.
+    """
+    if ner_on_gpu():
+        n_process = 1  # One process keeps the GPU busy; workers cannot share it
+    elif n_process is None:
+        n_process = max(1, (os.cpu_count() or 1) // 2)
+    return list(_pipe_locations(tweets, batch_size, n_process))
 
 
 def extract_location_from_tweet(tweet_text: str) -> Optional[str]:
     """
     Extract location from tweet using trained NER model
     """
-    doc = nlp(tweet_text)
-    locations = [ent.text for ent in doc.ents if ent.label_ in ["LOC", "GPE"]]
-    return locations[0] if locations else None
+    # A single tweet is never worth starting worker processes for
+    return next(extract_locations_from_tweets([tweet_text], n_process=1))
+
+
+def normalize_location_name(location_name: str) -> str:
+    """
+    Normalize a location name for geocode cache lookups
+    """
+    return ' '.join(location_name.split()).lower()
+
+
+def _load_cached_geocode(key: str) -> Optional[Tuple[float, float]]:
+    """
+    Read a geocoding result from the persistent cache table
+    """
+    db = SessionLocal()
+    try:
+        cached = db.get(GeocodeCache, key)
+        # Entries older than the TTL are refreshed from the geocoder
+        if cached and (cached.created_at is None or datetime.utcnow() - cached.created_at < GEOCODE_CACHE_TTL):
+            return (cached.latitude, cached.longitude)
+    except Exception as e:
+        print(f"Geocode cache read error: {e}")
+    finally:
+        db.close()
+    return None
+
+
+def _load_cached_geocodes(keys: List[str]) -> Dict[str, Tuple[float, float]]:
+    """
+    Read fresh geocoding results for several keys with one query
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            GeocodeCache.normalized_key, GeocodeCache.latitude, GeocodeCache.longitude
+        ).filter(
+            GeocodeCache.normalized_key.in_(keys),
+            (GeocodeCache.created_at.is_(None)) |
+            (GeocodeCache.created_at > datetime.utcnow() - GEOCODE_CACHE_TTL)
+        ).all()
+        return {key: (latitude, longitude) for key, latitude, longitude in rows}
+    except Exception as e:
+        print(f"Geocode cache read error: {e}")
+        return {}
+    finally:
+        db.close()
+
+
+def _store_cached_geocode(key: str, coords: Tuple[float, float]) -> None:
+    """
+    Write a geocoding result to the persistent cache table
+    """
+    db = SessionLocal()
+    try:
+        db.merge(GeocodeCache(
+            normalized_key=key,
+            latitude=coords[0],
+            longitude=coords[1],
+            created_at=datetime.utcnow()
+        ))
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # Another worker cached it first
+    except Exception as e:
+        db.rollback()
+        print(f"Geocode cache write error: {e}")
+    finally:
+        db.close()
+
+
+def _recall_geocode(key: str) -> Optional[Tuple[float, float]]:
+    """
+    Read an unexpired result from the in-process LRU
+    """
+    with _geocode_memory_lock:
+        entry = _geocode_memory.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _geocode_memory[key]
+            return None
+        _geocode_memory.move_to_end(key)
+        return entry[0]
+
+
+def _remember_geocode(key: str, coords: Tuple[float, float]) -> None:
+    """
+    Add a result to the in-process LRU, evicting the least recently used
+    """
+    with _geocode_memory_lock:
+        _geocode_memory[key] = (coords, time.monotonic() + GEOCODE_MEMORY_TTL)
+        _geocode_memory.move_to_end(key)
+        while len(_geocode_memory) > GEOCODE_CACHE_SIZE:
+            _geocode_memory.popitem(last=False)
+
+
+def _geocode_normalized(key: str) -> Optional[Tuple[float, float]]:
+    """
+    Geocode a normalized location name, consulting the in-process and
+    persistent caches first. Not-found results and network errors are not
+    cached, so they are retried on the next lookup.
+    """
+    coords = _recall_geocode(key)
+    if coords:
+        return coords
+    
+    coords = _load_cached_geocode(key)
+    if not coords:
+        location = _rate_limited_geocode(key)
+        if not location:
+            return None
+        coords = (location.latitude, location.longitude)
+        _store_cached_geocode(key, coords)
+    
+    _remember_geocode(key, coords)
+    return coords
 
 
 def geocode_location(location_name: str) -> Optional[Tuple[float, float]]:
@@ -34,20 +377,191 @@ def geocode_location(location_name: str) -> Optional[Tuple[float, float]]:
     Convert location name to latitude/longitude
     Returns: (latitude, longitude) or None
     """
+    if not location_name:
+        return None
     try:
-        location = geolocator.geocode(location_name, timeout=10)
-        if location:
-            return (location.latitude, location.longitude)
+        return _geocode_normalized(normalize_location_name(location_name))
     except Exception as e:
         print(f"Geocoding error: {e}")
     return None
 
 
+def _geocode_uncached(key: str):
+    """
+    Rate-limited geocoder call for one bulk cache miss; errors yield None
+    """
+    try:
+        return _rate_limited_geocode(key)
+    except Exception as e:
+        print(f"Geocoding error: {e}")
+        return None
+
+
+def geocode_many(location_names: List[str],
+                 max_lookups: Optional[int] = None) -> List[Optional[Tuple[float, float]]]:
+    """
+    Geocode a batch of location names.
+    Names in the in-process cache are answered directly and those in the
+    persistent cache are read with one query; the misses are geocoded on a
+    thread pool so network waits overlap, while the shared rate limiter
+    spaces the requests GEOCODE_MIN_DELAY apart. Only the first max_lookups
+    misses are sent to the geocoder; the others come back as None.
+    Returns one (latitude, longitude) or None per name, in order.
+    """
+    keys = [normalize_location_name(name) if name else '' for name in location_names]
+    unique_keys = list(dict.fromkeys(key for key in keys if key))
+    if not unique_keys:
+        return [None] * len(keys)
+    
+    resolved = {}
+    for key in unique_keys:
+        coords = _recall_geocode(key)
+        if coords:
+            resolved[key] = coords
+    
+    stored = _load_cached_geocodes([key for key in unique_keys if key not in resolved])
+    for key, coords in stored.items():
+        resolved[key] = coords
+        _remember_geocode(key, coords)
+    
+    misses = [key for key in unique_keys if key not in resolved][:max_lookups]
+    if misses:
+        with ThreadPoolExecutor(max_workers=GEOCODE_WORKERS) as pool:
+            for key, location in zip(misses, pool.map(_geocode_uncached, misses)):
+                if location:
+                    resolved[key] = (location.latitude, location.longitude)
+                    _store_cached_geocode(key, resolved[key])
+                    _remember_geocode(key, resolved[key])
+    
+    return [resolved.get(key) for key in keys]
+
+
+def prime_geocode_cache() -> int:
+    """
+    Seed the persistent geocode cache with locations already stored
+    on disaster events and hubs. Returns the number of entries added.
+    """
+    db = SessionLocal()
+    try:
+        known = {key for (key,) in db.query(GeocodeCache.normalized_key)}
+        events = db.query(
+            DisasterEvent.detected_location, DisasterEvent.latitude, DisasterEvent.longitude
+        ).filter(
+            DisasterEvent.detected_location.isnot(None),
+            DisasterEvent.latitude.isnot(None),
+            DisasterEvent.longitude.isnot(None)
+        ).distinct().all()
+        hubs = db.query(Hub.location_name, Hub.latitude, Hub.longitude).distinct().all()
+        
+        added = 0
+        for name, latitude, longitude in events + hubs:
+            key = normalize_location_name(name)
+            if not key or key in known:
+                continue
+            known.add(key)
+            db.add(GeocodeCache(normalized_key=key, latitude=latitude, longitude=longitude))
+            added += 1
+        
+        db.commit()
+        return added
+    except Exception as e:
+        db.rollback()
+        print(f"Geocode cache priming error: {e}")
+        return 0
+    finally:
+        db.close()
+
+
 def calculate_distance(coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
     """
-    Calculate distance between two coordinates in kilometers
+    Calculate great-circle distance between two coordinates in kilometers
+    """
+    return float(haversine_distances(coord1, np.radians([coord2]))[0])
+
+
+def haversine_distances(location: Tuple[float, float], coords: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distances in kilometers from location to an (N, 2) array
+    of (latitude, longitude) pairs given in radians
+    """
+    lat0, lon0 = np.radians(location[0]), np.radians(location[1])
+    lat1, lon1 = coords[:, 0], coords[:, 1]
+    a = np.sin((lat1 - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat1) * np.sin((lon1 - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _hub_coordinates(hubs: List[Dict]) -> np.ndarray:
+    """
+    Return the (N, 2) radian coordinate array for hubs, reusing the cached
+    array while the same hub list is passed in
+    """
+    if _hub_index['hubs'] is not hubs:
+        coords = np.array([(hub['latitude'], hub['longitude']) for hub in hubs], dtype=np.float64)
+        coords = np.radians(coords.reshape(-1, 2))
+        use_tree = BallTree is not None and len(hubs) >= HUB_TREE_MIN_SIZE
+        _hub_index['coords'] = coords
+        _hub_index['tree'] = BallTree(coords, metric='haversine') if use_tree else None
+        _hub_index['inventory'] = None
+        _hub_index['items'] = None
+        _hub_index['hubs'] = hubs
+    return _hub_index['coords']
+
+
+def invalidate_hub_index() -> None:
+    """
+    Drop cached hub coordinates and spatial index; call after hubs are
+    created, updated or deleted
+    """
+    _hub_index['hubs'] = None
+    _hub_index['coords'] = None
+    _hub_index['tree'] = None
+    _hub_index['inventory'] = None
+    _hub_index['items'] = None
+
+
+def _hubs_within(location: Tuple[float, float], hubs: List[Dict],
+                 max_distance_km: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return indices into hubs of those within max_distance_km of location,
+    along with their distances in kilometers
+    """
+    coords = _hub_coordinates(hubs)
+    tree = _hub_index['tree']
+    if tree is not None:
+        # The haversine metric returns central angles, which scale to km.
+        # Hits come back in tree order; restore hub-list order so ties are
+        # broken the same way as on the linear path
+        idx, angles = tree.query_radius(
+            np.radians([location]), r=max_distance_km / EARTH_RADIUS_KM, return_distance=True
+        )
+        order = np.argsort(idx[0])
+        return idx[0][order], angles[0][order] * EARTH_RADIUS_KM
+    
+    # Cheap bounding-box mask first so haversine only runs on candidates
+    candidates = np.flatnonzero(_bounding_box_mask(location, coords, max_distance_km))
+    distances = haversine_distances(location, coords[candidates])
+    within = distances <= max_distance_km
+    return candidates[within], distances[within]
+
+
+def _bounding_box_mask(location: Tuple[float, float], coords: np.ndarray,
+                       max_distance_km: float) -> np.ndarray:
+    """
+    Boolean mask of coords (radians) inside the latitude/longitude box that
+    encloses the max_distance_km circle around location; never drops a hub
+    the exact distance check would keep
     """
-    return geodesic(coord1, coord2).kilometers
+    lat0, lon0 = np.radians(location[0]), np.radians(location[1])
+    angle = max_distance_km / EARTH_RADIUS_KM
+    mask = np.abs(coords[:, 0] - lat0) <= angle
+    
+    # The circle's longitude span is arcsin(sin(angle) / cos(lat)); near the
+    # poles it covers every longitude
+    ratio = np.sin(angle) / max(np.cos(lat0), 1e-12)
+    if angle < np.pi / 2 and ratio < 1.0:
+        dlon = np.abs((coords[:, 1] - lon0 + np.pi) % (2 * np.pi) - np.pi)
+        mask &= dlon <= np.arcsin(ratio)
+    return mask
 
 
 def find_nearby_hubs(location: Tuple[float, float], hubs: List[Dict], max_distance_km: float = 50) -> List[Dict]:
@@ -55,17 +569,16 @@ def find_nearby_hubs(location: Tuple[float, float], hubs: List[Dict], max_distan
     Find hubs within specified distance from location
     Returns list of hubs with distance added
     """
+    if not hubs:
+        return []
+    
+    idx, distances = _hubs_within(location, hubs, max_distance_km)
+    
+    # Sort by distance on the array, then build dicts only for the hits
     nearby = []
-    for hub in hubs:
-        hub_coords = (hub['latitude'], hub['longitude'])
-        distance = calculate_distance(location, hub_coords)
-        if distance <= max_distance_km:
-            hub_with_distance = hub.copy()
-            hub_with_distance['distance_km'] = round(distance, 2)
-            nearby.append(hub_with_distance)
-    
-    # Sort by distance
-    nearby.sort(key=lambda x: x['distance_km'])
+    for k in np.argsort(distances, kind='stable'):
+        nearby.append({**hubs[idx[k]], 'distance_km': round(float(distances[k]), 2)})
+    
     return nearby
 
 
@@ -95,6 +608,92 @@ def calculate_match_score(requested: Dict[str, int], available: Dict[str, int])
     return (total_matched / total_requested) * 100
 
 
+def match_scores(req_qty: np.ndarray, available: np.ndarray) -> np.ndarray:
+    """
+    Vectorized calculate_match_score for the hub scoring fallback: req_qty
+    holds the requested quantities and each row of available one hub's
+    stock of those same items
+    """
+    total_requested = req_qty.sum()
+    if total_requested == 0:
+        return np.zeros(available.shape[0])
+    matched = np.where(available > 0, np.minimum(req_qty, available), 0.0).sum(axis=1)
+    return matched / total_requested * 100.0
+
+
+def _as_quantity(value) -> float:
+    """
+    Numeric item quantity, treating anything non-numeric as zero
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return 0.0
+
+
+def _hub_inventory(hubs: List[Dict]) -> Tuple[np.ndarray, Dict[str, int]]:
+    """
+    Return hub inventories as a dense (hubs x items) quantity matrix plus the
+    item name -> column table, cached alongside the hub coordinates
+    """
+    _hub_coordinates(hubs)
+    if _hub_index['inventory'] is None:
+        items = {}
+        for hub in hubs:
+            for item in (hub.get('inventory') or {}):
+                items.setdefault(item, len(items))
+        
+        inventory = np.zeros((len(hubs), len(items)), dtype=np.float64)
+        for row, hub in enumerate(hubs):
+            for item, quantity in (hub.get('inventory') or {}).items():
+                inventory[row, items[item]] = _as_quantity(quantity)
+        
+        _hub_index['inventory'] = inventory
+        _hub_index['items'] = items
+    return _hub_index['inventory'], _hub_index['items']
+
+
+if njit is not None:
+    # Serial on purpose: candidates are the few hubs within 100 km, and a
+    # parallel kernel called from several request threads can abort the
+    # process under numba's non-thread-safe workqueue layer
+    @njit(cache=True)
+    def _score_hubs(distances, rows, req_cols, req_qty, inventory):
+        """
+        Match score (0-100) and combined score for each candidate hub row;
+        req_cols holds inventory columns of the requested items (-1 if unknown)
+        """
+        n = rows.shape[0]
+        match_scores = np.zeros(n)
+        combined_scores = np.zeros(n)
+        total_requested = 0.0
+        for j in range(req_qty.shape[0]):
+            total_requested += req_qty[j]
+        
+        for k in range(n):
+            matched = 0.0
+            for j in range(req_cols.shape[0]):
+                col = req_cols[j]
+                if col >= 0:
+                    available = inventory[rows[k], col]
+                    if available > 0:
+                        matched += min(req_qty[j], available)
+            match_score = matched / total_requested * 100.0 if total_requested != 0 else 0.0
+            match_scores[k] = match_score
+            combined_scores[k] = match_score * 0.7 + (100.0 / (1.0 + distances[k])) * 0.3
+        return match_scores, combined_scores
+else:
+    def _score_hubs(distances, rows, req_cols, req_qty, inventory):
+        """
+        NumPy fallback for the numba kernel above
+        """
+        known = req_cols >= 0
+        available = np.zeros((len(rows), len(req_cols)))
+        available[:, known] = inventory[np.ix_(rows, req_cols[known])]
+        hub_scores = match_scores(req_qty, available)
+        combined_scores = hub_scores * 0.7 + (100.0 / (1.0 + distances)) * 0.3
+        return hub_scores, combined_scores
+
+
 def find_best_hub_for_request(victim_location: Tuple[float, float], 
                                requested_items: Dict[str, int],
                                hubs: List[Dict]) -> Optional[Dict]:
@@ -102,84 +701,184 @@ def find_best_hub_for_request(victim_location: Tuple[float, float],
     Find the best hub to fulfill a victim request
     Considers both distance and inventory match
     """
-    scored_hubs = []
+    if not hubs or not requested_items:
+        return None
     
-    for hub in hubs:
-        hub_coords = (hub['latitude'], hub['longitude'])
-        distance = calculate_distance(victim_location, hub_coords)
-        
-        # Skip hubs too far away (>100km)
-        if distance > 100:
-            continue
-        
-        # Calculate match score
-        inventory = hub.get('inventory', {})
-        match_score = calculate_match_score(requested_items, inventory)
-        
-        # Skip hubs with no matching items
-        if match_score == 0:
-            continue
-        
-        # Combined score: 70% match, 30% distance (inverse)
-        # Lower distance is better, so we use 1/(1+distance)
-        distance_score = 100 / (1 + distance)
-        combined_score = (match_score * 0.7) + (distance_score * 0.3)
+    # Only consider hubs within 100km
+    idx, distances = _hubs_within(victim_location, hubs, 100)
+    if len(idx) == 0:
+        return None
+    
+    inventory, items = _hub_inventory(hubs)
+    req_cols = np.array([items.get(item, -1) for item in requested_items], dtype=np.int64)
+    req_qty = np.array([_as_quantity(q) for q in requested_items.values()], dtype=np.float64)
+    
+    # Combined score: 70% match, 30% distance (inverse)
+    # Lower distance is better, so we use 1/(1+distance)
+    match_scores, combined_scores = _score_hubs(
+        distances, idx.astype(np.int64), req_cols, req_qty, inventory
+    )
+    
+    # Skip hubs with no matching items; highest (rounded) combined score
+    # wins, ties going to the earlier hub
+    best = max(
+        np.flatnonzero(match_scores != 0),
+        key=lambda k: round(float(combined_scores[k]), 1),
+        default=None
+    )
+    if best is None:
+        return None
+    
+    return {
+        **hubs[idx[best]],
+        'distance_km': round(float(distances[best]), 2),
+        'match_score': round(float(match_scores[best]), 1),
+        'combined_score': round(float(combined_scores[best]), 1)
+    }
+
+
+def warmup_hub_scoring() -> None:
+    """
+    Score one dummy hub so the numba kernel is compiled (or loaded from its
+    on-disk cache) before the first request, not during it
+    """
+    _score_hubs(
+        np.zeros(1), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64),
+        np.ones(1), np.ones((1, 1))
+    )
+
+
+# (category, keywords) pairs in priority order
+KeywordTable = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+
+def _best_category(hits: Iterable[Tuple[int, str]]) -> Optional[str]:
+    """
+    Return the highest-priority category among (priority, category) hits
+    """
+    best = None
+    for priority, category in hits:
+        if best is None or priority < best[0]:
+            best = (priority, category)
+            if priority == 0:
+                break
+    return best[1] if best else None
+
+
+def _build_keyword_scanner(keywords: KeywordTable) -> Callable[[str], Optional[str]]:
+    """
+    Build a function returning the first category (in table order) with a
+    keyword (substring, case-insensitive) in a text.
+    Uses one Aho-Corasick automaton when pyahocorasick is installed, else one
+    compiled alternation per category searched in priority order.
+    """
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for priority, (category, words) in enumerate(keywords):
+            for word in words:
+                if word not in automaton:
+                    automaton.add_word(word, (priority, category))
+        automaton.make_automaton()
         
-        scored_hubs.append({
-            **hub,
-            'distance_km': round(distance, 2),
-            'match_score': round(match_score, 1),
-            'combined_score': round(combined_score, 1)
-        })
+        def scan(text: str) -> Optional[str]:
+            return _best_category(value for _, value in automaton.iter(text.lower()))
+        return scan
     
-    # Sort by combined score
-    scored_hubs.sort(key=lambda x: x['combined_score'], reverse=True)
+    category_patterns = _compile_category_patterns(keywords)
     
-    return scored_hubs[0] if scored_hubs else None
+    def scan(text: str) -> Optional[str]:
+        for category, pattern in category_patterns:
+            if pattern.search(text):
+                return category
+        return None
+    return scan
+
+
+def _compile_category_patterns(keywords: KeywordTable) -> Tuple[Tuple[str, re.Pattern], ...]:
+    """
+    One case-insensitive alternation per category, preserving table order
+    """
+    return tuple(
+        (category, re.compile('|'.join(map(re.escape, words)), re.IGNORECASE))
+        for category, words in keywords
+    )
+
+
+# Keyword tables in priority order: the first category with a hit wins.
+# Immutable (category, keywords) pairs, built once at import
+DISASTER_KEYWORDS: KeywordTable = (
+    ('earthquake', ('earthquake', 'tremor', 'seismic', 'quake')),
+    ('flood', ('flood', 'flooding', 'inundation', 'deluge')),
+    ('hurricane', ('hurricane', 'cyclone', 'typhoon', 'storm')),
+    ('wildfire', ('wildfire', 'fire', 'blaze', 'burning')),
+    ('tornado', ('tornado', 'twister')),
+    ('tsunami', ('tsunami', 'tidal wave')),
+    ('landslide', ('landslide', 'mudslide')),
+    ('volcano', ('volcano', 'volcanic', 'eruption')),
+    ('drought', ('drought', 'dry', 'water shortage')),
+    ('blizzard', ('blizzard', 'snowstorm', 'winter storm'))
+)
+
+SEVERITY_KEYWORDS: KeywordTable = (
+    ('critical', ('death', 'dead', 'killed', 'catastrophic', 'devastating',
+                  'destroyed', 'massive', 'severe', 'emergency')),
+    ('high', ('major', 'serious', 'significant', 'heavy', 'damage')),
+    ('medium', ('moderate', 'warning', 'alert'))
+)
+
+_scan_disaster_type = _build_keyword_scanner(DISASTER_KEYWORDS)
+_scan_severity = _build_keyword_scanner(SEVERITY_KEYWORDS)
 
 
 def classify_disaster_type(tweet_text: str) -> str:
     """
     Simple keyword-based disaster type classification
     """
-    tweet_lower = tweet_text.lower()
-    
-    keywords = {
-        'earthquake': ['earthquake', 'tremor', 'seismic', 'quake'],
-        'flood': ['flood', 'flooding', 'inundation', 'deluge'],
-        'hurricane': ['hurricane', 'cyclone', 'typhoon', 'storm'],
-        'wildfire': ['wildfire', 'fire', 'blaze', 'burning'],
-        'tornado': ['tornado', 'twister'],
-        'tsunami': ['tsunami', 'tidal wave'],
-        'landslide': ['landslide', 'mudslide'],
-        'volcano': ['volcano', 'volcanic', 'eruption'],
-        'drought': ['drought', 'dry', 'water shortage'],
-        'blizzard': ['blizzard', 'snowstorm', 'winter storm']
-    }
-    
-    for disaster_type, words in keywords.items():
-        if any(word in tweet_lower for word in words):
-            return disaster_type
-    
-    return 'unknown'
+    return _scan_disaster_type(tweet_text) or 'unknown'
 
 
 def assess_severity(tweet_text: str) -> str:
     """
     Simple keyword-based severity assessment
     """
-    tweet_lower = tweet_text.lower()
-    
-    critical_keywords = ['death', 'dead', 'killed', 'catastrophic', 'devastating', 
-                        'destroyed', 'massive', 'severe', 'emergency']
-    high_keywords = ['major', 'serious', 'significant', 'heavy', 'damage']
-    medium_keywords = ['moderate', 'warning', 'alert']
-    
-    if any(word in tweet_lower for word in critical_keywords):
-        return 'critical'
-    elif any(word in tweet_lower for word in high_keywords):
-        return 'high'
-    elif any(word in tweet_lower for word in medium_keywords):
-        return 'medium'
-    else:
-        return 'low'
+    return _scan_severity(tweet_text) or 'low'
+
+
+def _build_tweet_classifier() -> Callable[[str], Tuple[str, str]]:
+    """
+    Build classify_tweet: with pyahocorasick, one automaton over both keyword
+    tables so a tweet is lowercased and scanned once for type and severity
+    """
+    if ahocorasick is None:
+        def classify_tweet(tweet_text: str) -> Tuple[str, str]:
+            """
+            Disaster type and severity of a tweet
+            """
+            return classify_disaster_type(tweet_text), assess_severity(tweet_text)
+        return classify_tweet
+    
+    automaton = ahocorasick.Automaton()
+    for table, keywords in enumerate((DISASTER_KEYWORDS, SEVERITY_KEYWORDS)):
+        for priority, (category, words) in enumerate(keywords):
+            for word in words:
+                hits = automaton.get(word, ())
+                if all(hit[0] != table for hit in hits):
+                    automaton.add_word(word, hits + ((table, priority, category),))
+    automaton.make_automaton()
+    
+    def classify_tweet(tweet_text: str) -> Tuple[str, str]:
+        """
+        Disaster type and severity of a tweet from a single keyword scan
+        """
+        best = [(len(DISASTER_KEYWORDS), 'unknown'), (len(SEVERITY_KEYWORDS), 'low')]
+        for _, hits in automaton.iter(tweet_text.lower()):
+            for table, priority, category in hits:
+                if priority < best[table][0]:
+                    best[table] = (priority, category)
+            if best[0][0] == 0 and best[1][0] == 0:
+                break
+        return best[0][1], best[1][1]
+    return classify_tweet
+
+
+classify_tweet = _build_tweet_classifier()
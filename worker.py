@@ -0,0 +1,30 @@
+"""
+RQ worker for the predictions queue
+Run with: python worker.py
+"""
+import os
+
+from dotenv import load_dotenv
+from redis import Redis
+from rq import SimpleWorker, Worker
+
+from utils.disaster_utils import NER_GPU, warmup_hub_scoring, warmup_nlp
+import tasks  # noqa: F401  (imported before forking, like the app under preload_app)
+
+load_dotenv()
+
+
+def main():
+    # Load the NER model and hub scoring kernel once here; the work-horse
+    # forked for each job inherits them instead of loading its own.
+    # A CUDA context does not survive fork, so GPU NER runs jobs in-process
+    warmup_nlp()
+    warmup_hub_scoring()
+    
+    worker_class = SimpleWorker if NER_GPU else Worker
+    connection = Redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'))
+    worker_class(['predictions'], connection=connection).work()
+
+
+if __name__ == '__main__':
+    main()